@@ -19,6 +19,12 @@ load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# Versioned prompt file in chatbot/prompts/ used as the system prompt
+CHATBOT_SYSTEM_PROMPT = os.getenv("CHATBOT_SYSTEM_PROMPT", "rizal_v1")
+
+# Seconds a session's conversation history stays cached between turns
+CHATBOT_HISTORY_CACHE_TIMEOUT = int(os.getenv("CHATBOT_HISTORY_CACHE_TIMEOUT", "3600"))
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -105,6 +111,17 @@ database_url = os.environ.get('DATABASE_URL')
 if database_url:
     DATABASES['default'] = dj_database_url.parse(database_url)
 
+# Cache (holds per-session conversation history, bounded by MAX_ENTRIES)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '1000')),
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,26 +1,182 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import ChatMessage, ChatSession, DailyUsage
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter by user through the admin autocomplete endpoint instead of
+    rendering a link for every user in the database.
+    """
+    title = 'user'
+    parameter_name = 'user__id__exact'
+    template = 'admin/chatbot/autocomplete_filter.html'
+    field_name = 'user'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        field = model._meta.get_field(self.field_name)
+        form_field = forms.ModelChoiceField(
+            queryset=User.objects.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+        # Invalid ids are rejected in queryset(); don't let the widget look them up
+        selected = self.value() if (self.value() or '').isdigit() else None
+        self.rendered_widget = form_field.widget.render(
+            self.parameter_name, selected, attrs={'style': 'width: 100%'}
+        )
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                return queryset.filter(**{f'{self.field_name}_id': self.value()})
+            except (ValueError, ValidationError) as e:
+                raise IncorrectLookupParameters(e)
+        return queryset
+
+
+class SenderFilter(admin.SimpleListFilter):
+    """Fixed sender choices, so the changelist skips a SELECT DISTINCT over every message."""
+    title = 'sender'
+    parameter_name = 'sender'
+
+    def lookups(self, request, model_admin):
+        return [('user', 'User'), ('rizal', 'Rizal')]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(sender=self.value())
+        return queryset
+
+
+class UserAutocompleteFilterMixin:
+    """Pulls in the select2 assets the autocomplete filter needs on the changelist."""
+
+    @property
+    def media(self):
+        field = self.model._meta.get_field(UserAutocompleteFilter.field_name)
+        return (
+            super().media
+            + AutocompleteSelect(field, self.admin_site).media
+            + forms.Media(js=['chatbot/admin/autocomplete_filter.js'])
+        )
 
-from .models import ChatMessage, ChatSession
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
+class ChatSessionAdmin(UserAutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ['id', 'user', 'title', 'message_count', 'created_at', 'updated_at']
-    list_filter = ['created_at', 'updated_at', 'user']
-    search_fields = ['title', 'user__username']
+    list_filter = ['created_at', 'updated_at', UserAutocompleteFilter]
+    list_select_related = ['user']
+    search_fields = ['title', '=user__username']
+    autocomplete_fields = ['user']
     readonly_fields = ['created_at', 'updated_at']
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Correlated subquery: only the sessions actually fetched get counted,
+        # and count() can drop it instead of grouping the whole message table
+        message_count = (
+            ChatMessage.objects.filter(session=OuterRef('pk'))
+            .order_by().values('session').annotate(c=Count('id')).values('c')
+        )
+        return super().get_queryset(request).annotate(
+            _message_count=Coalesce(Subquery(message_count), 0)
+        )
 
     def message_count(self, obj):
-        return obj.messages.count()
+        return obj._message_count
     message_count.short_description = 'Messages'
+    message_count.admin_order_field = '_message_count'
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(UserAutocompleteFilterMixin, admin.ModelAdmin):
+    """
+    Read-only: cached conversation history is only invalidated when the
+    session's updated_at moves, which admin message edits would bypass.
+    """
     list_display = ['id', 'session', 'user', 'sender', 'message_preview', 'timestamp']
-    list_filter = ['sender', 'timestamp', 'user']
-    search_fields = ['message', 'user__username']
-    readonly_fields = ['timestamp']
+    list_filter = [SenderFilter, 'timestamp', UserAutocompleteFilter]
+    list_select_related = ['session__user', 'user']
+    # Exact lookups only: icontains on the message body is a full table scan
+    search_fields = ['=user__username', '=session__id']
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
     def message_preview(self, obj):
         return obj.message[:50] + ('...' if len(obj.message) > 50 else '')
     message_preview.short_description = 'Message Preview'
 
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(UserAutocompleteFilterMixin, admin.ModelAdmin):
+    """Read-only usage dashboard; every query here hits the rollup table only."""
+    change_list_template = 'admin/chatbot/dailyusage/change_list.html'
+    list_display = ['date', 'user', 'model', 'turns', 'prompt_tokens', 'completion_tokens',
+                    'total_tokens', 'avg_latency_ms', 'latency_ms_max']
+    list_filter = ['model', UserAutocompleteFilter]
+    list_select_related = ['user']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # The rollup cursor has already moved past these rows; deleting them loses usage
+        return False
+
+    def total_tokens(self, obj):
+        return obj.total_tokens
+    total_tokens.short_description = 'Total tokens'
+
+    def avg_latency_ms(self, obj):
+        return obj.avg_latency_ms
+    avg_latency_ms.short_description = 'Avg latency (ms)'
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            # Redirects and error pages carry no changelist
+            return response
+
+        summary = list(
+            queryset.values('model')
+            .annotate(
+                turns=Sum('turns'),
+                prompt_tokens=Sum('prompt_tokens'),
+                completion_tokens=Sum('completion_tokens'),
+                latency_ms_total=Sum('latency_ms_total'),
+            )
+            .order_by('-turns')
+        )
+        for row in summary:
+            row['total_tokens'] = row['prompt_tokens'] + row['completion_tokens']
+            row['avg_latency_ms'] = row['latency_ms_total'] // row['turns'] if row['turns'] else 0
+        response.context_data['usage_summary'] = summary
+        return response
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ChatMessage, ChatSession
+
+# Number of previous messages (user + rizal) sent along with each turn
+HISTORY_LENGTH = 20
+
+
+def _cache_key(session_id):
+    return f"chatbot:history:{session_id}"
+
+
+def _to_api_message(sender, message):
+    return {"role": "user" if sender == "user" else "assistant", "content": message}
+
+
+def get_history(session):
+    """
+    Return the last HISTORY_LENGTH messages of a session, ready to send to the API.
+
+    The cached list is only trusted if it was stored for the session's current
+    updated_at. Every message write is followed by touch_session(), so any
+    write made after the entry was stored turns it stale.
+    """
+    entry = cache.get(_cache_key(session.pk))
+    if entry and entry['updated_at'] == session.updated_at:
+        return entry['messages']
+
+    previous_messages = ChatMessage.objects.filter(
+        session=session
+    ).order_by('-timestamp').values_list('sender', 'message')[:HISTORY_LENGTH]
+    return [_to_api_message(sender, message) for sender, message in reversed(previous_messages)]
+
+
+def touch_session(session, seen, **fields):
+    """
+    Move session.updated_at forward (saving any extra fields) after a message write.
+
+    Returns True only if updated_at still equalled `seen`, i.e. no other turn
+    wrote to the session in between. Otherwise the stamp is moved anyway so
+    cached history everywhere goes stale, and False is returned: the caller's
+    view of the history is incomplete and must not be cached.
+    """
+    now = timezone.now()
+    sessions = ChatSession.objects.filter(pk=session.pk)
+    unchanged = sessions.filter(updated_at=seen).update(updated_at=now, **fields) == 1
+    if not unchanged:
+        sessions.update(updated_at=now, **fields)
+    session.updated_at = now
+    for name, value in fields.items():
+        setattr(session, name, value)
+    return unchanged
+
+
+def store_history(session, history, *new_messages):
+    """Cache history plus new (sender, message) pairs, stamped with session.updated_at."""
+    messages = history + [_to_api_message(sender, message) for sender, message in new_messages]
+    cache.set(
+        _cache_key(session.pk),
+        {'updated_at': session.updated_at, 'messages': messages[-HISTORY_LENGTH:]},
+        settings.CHATBOT_HISTORY_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_history(session_id):
+    cache.delete(_cache_key(session_id))
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.models import ChatMessage, ChatSession
+
+# NDJSON key -> queryset.values() lookup
+SESSION_FIELDS = {
+    'id': 'id',
+    'user': 'user__username',
+    'title': 'title',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+MESSAGE_FIELDS = {
+    'id': 'id',
+    'session': 'session_id',
+    'user': 'user__username',
+    'sender': 'sender',
+    'message': 'message',
+    'timestamp': 'timestamp',
+    'model': 'model',
+    'prompt_tokens': 'prompt_tokens',
+    'completion_tokens': 'completion_tokens',
+    'latency_ms': 'latency_ms',
+}
+
+
+class Command(BaseCommand):
+    help = "Stream chat sessions and messages out as NDJSON (all sessions first, then messages)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help="File to write to, or '-' for stdout (default)",
+        )
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='Only export chats of this username; may be repeated',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Rows fetched from the database per round trip (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        sessions = ChatSession.objects.all()
+        messages = ChatMessage.objects.all()
+        if options['usernames']:
+            sessions = sessions.filter(user__username__in=options['usernames'])
+            messages = messages.filter(user__username__in=options['usernames'])
+
+        out = self.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        try:
+            session_count = self._write(out, 'session', sessions.order_by('id'), SESSION_FIELDS, options['batch_size'])
+            message_count = self._write(out, 'message', messages.order_by('id'), MESSAGE_FIELDS, options['batch_size'])
+        finally:
+            if out is not self.stdout:
+                out.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {session_count} sessions and {message_count} messages."
+        ))
+
+    def _write(self, out, record_type, queryset, fields, batch_size):
+        count = 0
+        for row in queryset.values(*fields.values()).iterator(chunk_size=batch_size):
+            record = {'type': record_type}
+            for key, lookup in fields.items():
+                value = row[lookup]
+                # Full isoformat keeps microseconds, which ordering and truncate rely on
+                record[key] = value.isoformat() if isinstance(value, datetime) else value
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+        return count
@@ -0,0 +1,221 @@
+import json
+import sys
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from chatbot.models import ChatMessage, ChatSession
+
+# Fields whose auto_now/auto_now_add would otherwise overwrite the exported values
+TIMESTAMP_FIELDS = [
+    (ChatSession, 'created_at'),
+    (ChatSession, 'updated_at'),
+    (ChatMessage, 'timestamp'),
+]
+
+
+@contextmanager
+def preserve_timestamps():
+    """Temporarily switch off auto_now/auto_now_add so bulk_create keeps imported datetimes."""
+    saved = []
+    for model, name in TIMESTAMP_FIELDS:
+        field = model._meta.get_field(name)
+        saved.append((field, field.auto_now, field.auto_now_add))
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Load NDJSON produced by export_chats using batched bulk_create. "
+        "Bypasses the ChatSession/ChatMessage save() hooks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file to read, or '-' for stdin")
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per bulk_create (default: 5000)',
+        )
+        parser.add_argument(
+            '--map-user', action='append', default=[], metavar='OLD:NEW',
+            help='Import chats of username OLD as username NEW; may be repeated',
+        )
+        parser.add_argument(
+            '--default-user',
+            help='Username that receives chats whose user does not exist here',
+        )
+        parser.add_argument(
+            '--create-missing-users', action='store_true',
+            help='Create users (with unusable passwords) that do not exist here',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=1,
+            help='Import the file this many times, e.g. to seed load-test data (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        if options['repeat'] > 1 and options['path'] == '-':
+            raise CommandError("--repeat needs a file path, stdin can only be read once.")
+
+        self.batch_size = options['batch_size']
+        self.create_missing_users = options['create_missing_users']
+        self.user_map = {}
+        for mapping in options['map_user']:
+            old, sep, new = mapping.partition(':')
+            if not sep or not old or not new:
+                raise CommandError(f"Invalid --map-user '{mapping}', expected OLD:NEW.")
+            self.user_map[old] = new
+
+        self.user_ids = {}
+        self.default_user_id = None
+        if options['default_user']:
+            try:
+                self.default_user_id = User.objects.get(username=options['default_user']).pk
+            except User.DoesNotExist:
+                raise CommandError(f"Default user '{options['default_user']}' does not exist.")
+
+        totals = {'session': 0, 'message': 0, 'skipped': 0}
+        with transaction.atomic(), preserve_timestamps():
+            for _ in range(options['repeat']):
+                for key, count in self._import(options['path']).items():
+                    totals[key] += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['session']} sessions and {totals['message']} messages "
+            f"({totals['skipped']} messages skipped for unknown sessions)."
+        ))
+
+    def _import(self, path):
+        # Exported session id -> new session id, rebuilt on every pass
+        self.session_ids = {}
+        self.pending_sessions = []
+        self.pending_messages = []
+        self.counts = {'session': 0, 'message': 0, 'skipped': 0}
+
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        try:
+            for line_number, line in enumerate(source, start=1):
+                self.line_number = line_number
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise CommandError(f"Line {line_number}: invalid JSON ({e}).")
+
+                record_type = record.get('type')
+                if record_type == 'session':
+                    self._add_session(record)
+                elif record_type == 'message':
+                    self._add_message(record)
+                else:
+                    raise CommandError(f"Line {line_number}: unknown record type '{record_type}'.")
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        self._flush_sessions()
+        self._flush_messages()
+        return self.counts
+
+    def _resolve_user(self, username):
+        username = self.user_map.get(username, username)
+        if username in self.user_ids:
+            return self.user_ids[username]
+
+        user_id = User.objects.filter(username=username).values_list('pk', flat=True).first()
+        if user_id is None:
+            if self.create_missing_users:
+                user = User(username=username)
+                user.set_unusable_password()
+                user.save()
+                user_id = user.pk
+            elif self.default_user_id is not None:
+                user_id = self.default_user_id
+            else:
+                raise CommandError(
+                    f"User '{username}' does not exist. Use --map-user, --default-user "
+                    "or --create-missing-users."
+                )
+        self.user_ids[username] = user_id
+        return user_id
+
+    def _parse_datetime(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            parsed = parse_datetime(value)
+        except (TypeError, ValueError):
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Line {self.line_number}: invalid datetime '{value}'.")
+        if timezone.is_naive(parsed):
+            # Exports are always offset-aware; treat hand-written naive values as TIME_ZONE
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def _add_session(self, record):
+        session = ChatSession(
+            user_id=self._resolve_user(record['user']),
+            title=record.get('title') or '',
+            created_at=self._parse_datetime(record.get('created_at')),
+            updated_at=self._parse_datetime(record.get('updated_at')),
+        )
+        self.pending_sessions.append((record.get('id'), session))
+        if len(self.pending_sessions) >= self.batch_size:
+            self._flush_sessions()
+
+    def _add_message(self, record):
+        old_session_id = record.get('session')
+        if old_session_id is not None and old_session_id not in self.session_ids:
+            # The session may still be waiting in the buffer
+            self._flush_sessions()
+            if old_session_id not in self.session_ids:
+                self.counts['skipped'] += 1
+                return
+
+        message = ChatMessage(
+            session_id=self.session_ids.get(old_session_id),
+            user_id=self._resolve_user(record['user']),
+            sender=record['sender'],
+            message=record['message'],
+            timestamp=self._parse_datetime(record.get('timestamp')),
+            model=record.get('model') or '',
+            prompt_tokens=record.get('prompt_tokens'),
+            completion_tokens=record.get('completion_tokens'),
+            latency_ms=record.get('latency_ms'),
+        )
+        self.pending_messages.append(message)
+        if len(self.pending_messages) >= self.batch_size:
+            self._flush_messages()
+
+    def _flush_sessions(self):
+        if not self.pending_sessions:
+            return
+        created = ChatSession.objects.bulk_create([session for _, session in self.pending_sessions])
+        for (old_id, _), session in zip(self.pending_sessions, created):
+            if session.pk is None:
+                raise CommandError("This database backend does not return ids from bulk_create.")
+            if old_id is not None:
+                self.session_ids[old_id] = session.pk
+        self.counts['session'] += len(created)
+        self.pending_sessions = []
+
+    def _flush_messages(self):
+        if not self.pending_messages:
+            return
+        ChatMessage.objects.bulk_create(self.pending_messages)
+        self.counts['message'] += len(self.pending_messages)
+        self.pending_messages = []
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from chatbot.models import ChatMessage, DailyUsage, UsageRollupCursor
+
+
+class Command(BaseCommand):
+    help = "Fold new 'rizal' replies into the DailyUsage rollup table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help='Number of message ids folded per transaction (default: 50000)',
+        )
+        parser.add_argument(
+            '--settle-seconds', type=int, default=60,
+            help='Skip messages newer than this so in-flight transactions can commit (default: 60)',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop the rollup and recompute it from the full message table',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        if options['rebuild']:
+            with transaction.atomic():
+                DailyUsage.objects.all().delete()
+                UsageRollupCursor.objects.update_or_create(pk=1, defaults={'last_message_id': 0})
+
+        cutoff = timezone.now() - timedelta(seconds=options['settle_seconds'])
+        upper = ChatMessage.objects.filter(timestamp__lte=cutoff).aggregate(m=Max('id'))['m']
+        start = UsageRollupCursor.get().last_message_id
+        if upper is None or upper <= start:
+            self.stdout.write("Usage rollup is up to date.")
+            return
+
+        groups = 0
+        while start < upper:
+            end = min(start + chunk_size, upper)
+            groups += self._fold(start, end)
+            start = end
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded messages up to id {upper} into {groups} daily usage rows."
+        ))
+
+    @transaction.atomic
+    def _fold(self, start, end):
+        """Add replies with start < id <= end to the rollup and advance the cursor."""
+        cursor = UsageRollupCursor.objects.select_for_update().get(pk=1)
+        if cursor.last_message_id != start:
+            # Another run got here first; let it own this range
+            return 0
+
+        rows = (
+            ChatMessage.objects
+            .filter(sender='rizal', id__gt=start, id__lte=end)
+            .annotate(date=TruncDate('timestamp'))
+            .values('date', 'user_id', 'model')
+            .annotate(
+                turns=Count('id'),
+                prompt_tokens=Sum('prompt_tokens', default=0),
+                completion_tokens=Sum('completion_tokens', default=0),
+                latency_ms_total=Sum('latency_ms', default=0),
+                latency_ms_max=Max('latency_ms', default=0),
+            )
+            .order_by()
+        )
+
+        count = 0
+        for row in rows:
+            usage, created = DailyUsage.objects.select_for_update().get_or_create(
+                date=row['date'], user_id=row['user_id'], model=row['model'],
+                defaults={
+                    'turns': row['turns'],
+                    'prompt_tokens': row['prompt_tokens'],
+                    'completion_tokens': row['completion_tokens'],
+                    'latency_ms_total': row['latency_ms_total'],
+                    'latency_ms_max': row['latency_ms_max'],
+                },
+            )
+            if not created:
+                DailyUsage.objects.filter(pk=usage.pk).update(
+                    turns=F('turns') + row['turns'],
+                    prompt_tokens=F('prompt_tokens') + row['prompt_tokens'],
+                    completion_tokens=F('completion_tokens') + row['completion_tokens'],
+                    latency_ms_total=F('latency_ms_total') + row['latency_ms_total'],
+                    latency_ms_max=max(usage.latency_ms_max, row['latency_ms_max']),
+                )
+            count += 1
+
+        cursor.last_message_id = end
+        cursor.save()
+        return count
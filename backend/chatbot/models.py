@@ -28,6 +28,11 @@ class ChatMessage(models.Model):
     sender = models.CharField(max_length=10)  # 'user' or 'rizal'
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Upstream usage, only recorded on 'rizal' replies
+    model = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['timestamp']
@@ -48,3 +53,44 @@ class ChatMessage(models.Model):
             self.session = existing_session
         super().save(*args, **kwargs)
 
+
+
+class DailyUsage(models.Model):
+    """Daily per-user, per-model rollup of 'rizal' replies, maintained by the rollup_usage command."""
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=100, blank=True)
+    turns = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    latency_ms_total = models.PositiveBigIntegerField(default=0)
+    latency_ms_max = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date', 'user', 'model']
+        verbose_name_plural = 'daily usage'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user', 'model'], name='unique_daily_usage'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.user.username} {self.model or 'unknown model'}"
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def avg_latency_ms(self):
+        return self.latency_ms_total // self.turns if self.turns else 0
+
+
+class UsageRollupCursor(models.Model):
+    """Single-row watermark: the highest ChatMessage id already folded into DailyUsage."""
+    last_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get(cls):
+        cursor, _ = cls.objects.get_or_create(pk=1)
+        return cursor
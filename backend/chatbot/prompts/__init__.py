@@ -0,0 +1,13 @@
+from functools import lru_cache
+from pathlib import Path
+
+PROMPTS_DIR = Path(__file__).resolve().parent
+
+
+@lru_cache(maxsize=None)
+def load_prompt(name):
+    """
+    Read a versioned prompt template (e.g. 'rizal_v1' -> prompts/rizal_v1.txt).
+    Each file is read once per process; bump the version suffix to change a prompt.
+    """
+    return (PROMPTS_DIR / f"{name}.txt").read_text(encoding='utf-8').strip()
@@ -0,0 +1,17 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Reload the changelist with the picked value, like clicking a regular filter link
+    $(document).on('change', '.chatbot-autocomplete-filter select', function() {
+        const parameter = $(this).closest('.chatbot-autocomplete-filter').data('parameter');
+        const params = new URLSearchParams(window.location.search);
+        if (this.value) {
+            params.set(parameter, this.value);
+        } else {
+            params.delete(parameter);
+        }
+        params.delete('p');
+        window.location.search = params.toString();
+    });
+}
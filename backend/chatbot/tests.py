@@ -1,3 +1,351 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import ChatMessage, ChatSession, DailyUsage
+from .views import ChatAPIView
+
+
+class UsageAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.admin)
+
+    def test_invalid_user_filter_redirects_instead_of_erroring(self):
+        for model in ['chatsession', 'chatmessage', 'dailyusage']:
+            response = self.client.get(f'/admin/chatbot/{model}/?user__id__exact=abc')
+            self.assertRedirects(response, f'/admin/chatbot/{model}/?e=1', fetch_redirect_response=False)
+
+    def test_daily_usage_rows_cannot_be_deleted(self):
+        usage = DailyUsage.objects.create(date='2025-06-07', user=self.admin, model='m', turns=1)
+        self.assertNotContains(self.client.get('/admin/chatbot/dailyusage/'), 'delete_selected')
+        response = self.client.post(f'/admin/chatbot/dailyusage/{usage.pk}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(DailyUsage.objects.filter(pk=usage.pk).exists())
+
+    def test_rollup_rejects_non_positive_chunk_size(self):
+        with self.assertRaises(CommandError):
+            call_command('rollup_usage', '--chunk-size', '0')
+
+    def test_message_count_matches_messages(self):
+        busy = ChatSession.objects.create(user=self.admin, title='Busy')
+        ChatSession.objects.create(user=self.admin, title='Empty')
+        for sender in ['user', 'rizal', 'user']:
+            ChatMessage.objects.create(session=busy, user=self.admin, sender=sender, message='Hi')
+        cl = self.client.get('/admin/chatbot/chatsession/').context['cl']
+        counts = {session.title: cl.model_admin.message_count(session) for session in cl.result_list}
+        self.assertEqual(counts, {'Busy': 3, 'Empty': 0})
+
+    def test_changelists_do_not_scan_message_table(self):
+        session = ChatSession.objects.create(user=self.admin, title='Noli')
+        ChatMessage.objects.create(session=session, user=self.admin, sender='rizal', message='Hi')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/chatbot/chatmessage/?sender=rizal')
+            self.client.get('/admin/chatbot/chatsession/')
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([q for q in sql if 'DISTINCT' in q or 'JOIN "chatbot_chatmessage"' in q])
+
+    def test_usage_summary_respects_user_filter(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        DailyUsage.objects.create(date='2025-06-07', user=self.admin, model='m', turns=2,
+                                  prompt_tokens=10, completion_tokens=4, latency_ms_total=300)
+        DailyUsage.objects.create(date='2025-06-07', user=other, model='m', turns=5,
+                                  prompt_tokens=50, completion_tokens=20, latency_ms_total=1000)
+        response = self.client.get(f'/admin/chatbot/dailyusage/?user__id__exact={self.admin.pk}')
+        self.assertEqual(response.context['usage_summary'], [{
+            'model': 'm', 'turns': 2, 'prompt_tokens': 10, 'completion_tokens': 4,
+            'latency_ms_total': 300, 'total_tokens': 14, 'avg_latency_ms': 150,
+        }])
+
+
+class RollupUsageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rizal_fan', 'fan@example.com', 'pw')
+        self.session = ChatSession.objects.create(user=self.user, title='Noli')
+
+    def _reply(self, model='m', prompt_tokens=10, completion_tokens=5, latency_ms=100):
+        ChatMessage.objects.create(session=self.session, user=self.user, sender='user', message='Question')
+        ChatMessage.objects.create(session=self.session, user=self.user, sender='rizal', message='Answer', model=model,
+                                   prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, latency_ms=latency_ms)
+
+    def _rollup(self, *args):
+        call_command('rollup_usage', '--settle-seconds', '0', *args, stdout=StringIO())
+
+    def _totals(self):
+        return list(DailyUsage.objects.order_by('model').values(
+            'model', 'turns', 'prompt_tokens', 'completion_tokens', 'latency_ms_total', 'latency_ms_max'
+        ))
+
+    def test_incremental_runs_only_add_new_replies(self):
+        self._reply(latency_ms=100)
+        self._reply(latency_ms=300)
+        self._reply(model='other', prompt_tokens=1, completion_tokens=1, latency_ms=50)
+        self._rollup('--chunk-size', '2')
+        self.assertEqual(self._totals(), [
+            {'model': 'm', 'turns': 2, 'prompt_tokens': 20, 'completion_tokens': 10,
+             'latency_ms_total': 400, 'latency_ms_max': 300},
+            {'model': 'other', 'turns': 1, 'prompt_tokens': 1, 'completion_tokens': 1,
+             'latency_ms_total': 50, 'latency_ms_max': 50},
+        ])
+
+        self._reply(latency_ms=900)
+        self._rollup('--chunk-size', '2')
+        self._rollup()
+        self.assertEqual(self._totals()[0], {
+            'model': 'm', 'turns': 3, 'prompt_tokens': 30, 'completion_tokens': 15,
+            'latency_ms_total': 1300, 'latency_ms_max': 900,
+        })
+
+    def test_rebuild_matches_incremental_totals(self):
+        self._reply(latency_ms=100)
+        self._rollup()
+        self._reply(model='other', latency_ms=200)
+        self._reply(latency_ms=400)
+        self._rollup('--chunk-size', '1')
+        incremental = self._totals()
+
+        self._rollup('--rebuild')
+        self.assertEqual(self._totals(), incremental)
+
+    def test_settle_cutoff_skips_fresh_messages(self):
+        self._reply()
+        call_command('rollup_usage', '--settle-seconds', '3600', stdout=StringIO())
+        self.assertFalse(DailyUsage.objects.exists())
+        self._rollup()
+        self.assertEqual(DailyUsage.objects.get().turns, 1)
+
+
+class ChatExportImportTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+
+    def test_round_trip_keeps_timestamps_users_and_sessions(self):
+        first = ChatSession.objects.create(user=self.alice, title='First')
+        second = ChatSession.objects.create(user=self.alice, title='Second')
+        for session in (first, second):
+            ChatMessage.objects.create(session=session, user=self.alice, sender='user', message=f'Hi {session.title}')
+            ChatMessage.objects.create(session=session, user=self.alice, sender='rizal', message=f'Reply {session.title}',
+                                       model='m', prompt_tokens=5, completion_tokens=2, latency_ms=100)
+        # Exact microseconds are what ordering and truncate compare against
+        ChatMessage.objects.filter(session=first, sender='user').update(
+            timestamp=datetime(2025, 6, 7, 11, 0, 57, 478528, tzinfo=dt_timezone.utc)
+        )
+        exported_sessions = list(ChatSession.objects.order_by('id').values('title', 'created_at', 'updated_at'))
+        exported_messages = list(ChatMessage.objects.order_by('id').values(
+            'session__title', 'sender', 'message', 'timestamp', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms'
+        ))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'chats.ndjson')
+            call_command('export_chats', '-o', path, stderr=StringIO())
+            call_command('import_chats', path, '--map-user', 'alice:bob', '--batch-size', '1', stdout=StringIO())
+
+        imported_sessions = ChatSession.objects.filter(user=self.bob).order_by('id')
+        self.assertEqual(list(imported_sessions.values('title', 'created_at', 'updated_at')), exported_sessions)
+        imported_messages = ChatMessage.objects.filter(user=self.bob).order_by('id')
+        self.assertEqual(list(imported_messages.values(
+            'session__title', 'sender', 'message', 'timestamp', 'model', 'prompt_tokens', 'completion_tokens', 'latency_ms'
+        )), exported_messages)
+        self.assertFalse(imported_messages.exclude(session__user=self.bob).exists())
+        self.assertEqual(
+            imported_messages.get(session__title='First', sender='user').timestamp.microsecond, 478528
+        )
+
+
+    def _write_ndjson(self, *records):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'chats.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write((record if isinstance(record, str) else json.dumps(record)) + '\n')
+        return path
+
+    def _import(self, path, *args):
+        call_command('import_chats', path, *args, stdout=StringIO())
+
+    def _session(self, user='carol', session_id=1, **fields):
+        return {'type': 'session', 'id': session_id, 'user': user, 'title': 'Noli',
+                'created_at': '2025-06-07T11:00:00+00:00', 'updated_at': '2025-06-07T11:05:00+00:00', **fields}
+
+    def _message(self, user='carol', session_id=1, **fields):
+        return {'type': 'message', 'session': session_id, 'user': user, 'sender': 'user',
+                'message': 'Hello', 'timestamp': '2025-06-07T11:01:00+00:00', **fields}
+
+    def test_unknown_user_raises(self):
+        path = self._write_ndjson(self._session(), self._message())
+        with self.assertRaisesMessage(CommandError, "User 'carol' does not exist"):
+            self._import(path)
+        self.assertFalse(ChatSession.objects.exists())
+
+    def test_default_user_receives_unknown_users_chats(self):
+        self._import(self._write_ndjson(self._session(), self._message()), '--default-user', 'alice')
+        self.assertEqual(ChatSession.objects.get().user, self.alice)
+        self.assertEqual(ChatMessage.objects.get().user, self.alice)
+        self.assertFalse(User.objects.filter(username='carol').exists())
+
+    def test_create_missing_users(self):
+        self._import(self._write_ndjson(self._session(), self._message()), '--create-missing-users')
+        carol = User.objects.get(username='carol')
+        self.assertFalse(carol.has_usable_password())
+        self.assertEqual(ChatMessage.objects.get().session.user, carol)
+
+    def test_messages_of_missing_sessions_are_skipped(self):
+        path = self._write_ndjson(self._session(user='alice'), self._message(user='alice'),
+                                  self._message(user='alice', session_id=99))
+        out = StringIO()
+        call_command('import_chats', path, stdout=out)
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertIn('1 messages skipped', out.getvalue())
+
+    def test_repeat_imports_file_several_times(self):
+        self._import(self._write_ndjson(self._session(user='alice'), self._message(user='alice')), '--repeat', '3')
+        self.assertEqual(ChatSession.objects.count(), 3)
+        # Every pass links its messages to its own copy of the session
+        self.assertEqual(sorted(ChatMessage.objects.values_list('session_id', flat=True)),
+                         sorted(ChatSession.objects.values_list('id', flat=True)))
+        with self.assertRaisesMessage(CommandError, '--repeat needs a file path'):
+            self._import('-', '--repeat', '2')
+
+    def test_bad_lines_raise_with_line_number(self):
+        cases = [
+            ('{not json', 'Line 2: invalid JSON'),
+            ({'type': 'bogus'}, "Line 2: unknown record type 'bogus'"),
+            (self._session(user='alice', session_id=2, created_at='yesterday'), "Line 2: invalid datetime 'yesterday'"),
+        ]
+        for bad_line, error in cases:
+            with self.subTest(error=error):
+                path = self._write_ndjson(self._session(user='alice'), bad_line)
+                with self.assertRaisesMessage(CommandError, error):
+                    self._import(path)
+                self.assertFalse(ChatSession.objects.exists())
+
+    def test_naive_datetimes_are_made_aware(self):
+        self._import(self._write_ndjson(self._session(user='alice', created_at='2025-06-07T11:00:00')))
+        self.assertEqual(ChatSession.objects.get().created_at, datetime(2025, 6, 7, 11, 0, tzinfo=dt_timezone.utc))
+
+    def test_batch_size_must_be_positive(self):
+        path = self._write_ndjson(self._session(user='alice'))
+        with self.assertRaisesMessage(CommandError, '--batch-size must be at least 1'):
+            self._import(path, '--batch-size', '0')
+        with self.assertRaisesMessage(CommandError, '--batch-size must be at least 1'):
+            call_command('export_chats', '--batch-size', '0', stdout=StringIO(), stderr=StringIO())
+
+
+class ChatHistoryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('rizal_fan', 'fan@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.sent = []
+        self.on_upstream_call = None
+        patcher = mock.patch.object(ChatAPIView, 'openrouter_api_key', 'test-key')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('chatbot.views.requests.post', side_effect=self._fake_upstream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fake_upstream(self, url, headers, json):
+        self.sent.append([m['content'] for m in json['messages'][1:]])
+        if self.on_upstream_call:
+            callback, self.on_upstream_call = self.on_upstream_call, None
+            callback()
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'choices': [{'message': {'content': f'R{len(self.sent)}'}}]}
+        return response
+
+    def _chat(self, message, session_id=None):
+        payload = {'message': message}
+        if session_id:
+            payload['session_id'] = session_id
+        return self.client.post('/api/chat/', payload, format='json')
+
+    def _cached(self, session_id):
+        return cache.get(f'chatbot:history:{session_id}')
+
+    def _stored_messages(self, session_id):
+        return list(ChatMessage.objects.filter(session_id=session_id).order_by('timestamp').values_list('message', flat=True))
+
+    def test_follow_up_turn_reads_history_from_cache(self):
+        session_id = self._chat('first').data['session_id']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._chat('second', session_id).status_code, 200)
+        history_reads = [q['sql'] for q in queries.captured_queries
+                         if q['sql'].startswith('SELECT') and 'chatbot_chatmessage' in q['sql']]
+        self.assertEqual(history_reads, [])
+        self.assertEqual(self.sent[-1], ['first', 'R1', 'second'])
+
+    def test_truncate_title_edit_and_delete_drop_the_entry(self):
+        session_id = self._chat('first').data['session_id']
+        self._chat('second', session_id)
+        self.assertIsNotNone(self._cached(session_id))
+        timestamp = ChatMessage.objects.get(session_id=session_id, message='second').timestamp.isoformat()
+        self.client.post(f'/api/sessions/{session_id}/truncate/', {'from_timestamp': timestamp}, format='json')
+        self.assertIsNone(self._cached(session_id))
+
+        self._chat('third', session_id)
+        self.assertEqual(self.sent[-1], ['first', 'R1', 'third'])
+        self.assertIsNotNone(self._cached(session_id))
+        self.client.put(f'/api/sessions/{session_id}/', {'title': 'Renamed'}, format='json')
+        self.assertIsNone(self._cached(session_id))
+
+        self._chat('fourth', session_id)
+        self.assertIsNotNone(self._cached(session_id))
+        self.client.delete(f'/api/sessions/{session_id}/')
+        self.assertIsNone(self._cached(session_id))
+
+    def test_failed_upstream_call_leaves_no_entry(self):
+        session_id = self._chat('first').data['session_id']
+        self.assertIsNotNone(self._cached(session_id))
+        with mock.patch('chatbot.views.requests.post', return_value=mock.Mock(status_code=502, text='bad gateway')):
+            self.assertEqual(self._chat('second', session_id).status_code, 500)
+        self.assertIsNone(self._cached(session_id))
+
+        self._chat('third', session_id)
+        self.assertEqual(self.sent[-1], ['first', 'R1', 'second', 'third'])
+
+    def test_admin_cannot_edit_or_delete_cached_messages(self):
+        session_id = self._chat('first').data['session_id']
+        message = ChatMessage.objects.get(session_id=session_id, message='first')
+        staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        admin_client = Client()
+        admin_client.force_login(staff)
+
+        url = f'/admin/chatbot/chatmessage/{message.pk}'
+        response = admin_client.post(f'{url}/change/', {'message': 'edited', 'sender': 'user'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(admin_client.post(f'{url}/delete/', {'post': 'yes'}).status_code, 403)
+        self.assertNotContains(admin_client.get('/admin/chatbot/chatmessage/'), 'delete_selected')
+
+        self._chat('second', session_id)
+        self.assertEqual(self.sent[-1], ['first', 'R1', 'second'])
+
+    def test_overlapping_turns_do_not_cache_partial_history(self):
+        session_id = self._chat('first').data['session_id']
+        self._chat('warm', session_id)
+        # Turn B runs to completion while turn A waits on the upstream call
+        self.on_upstream_call = lambda: self._chat('B', session_id)
+        self._chat('A', session_id)
+
+        self._chat('next', session_id)
+        stored = self._stored_messages(session_id)
+        self.assertEqual(stored[-2], 'next')
+        # Everything but the reply to 'next' was sent, including B's exchange
+        self.assertEqual(self.sent[-1], stored[:-1])
+        self.assertIn('B', self.sent[-1])